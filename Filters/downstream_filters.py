@@ -4,6 +4,7 @@ import numpy
 import pandas as pd
 import pymatgen.core as mg
 import itertools
+from Filters.stoichiometry_filter import stoichiometry_matches
 
 
 
@@ -138,8 +139,7 @@ def match_stoichimetric_combinations(stoichiometry : list ,df: pd.DataFrame):
     Returns:
     pandas.Series: A Series indicating whether the atoms in each row of the input DataFrame match the given stoichiometry.
     """
-    atoms = pd.Series(df["Atoms"])
-    matches = atoms.isin(stoichiometry)
+    matches = stoichiometry_matches(df["Atoms"], stoichiometry)
     return matches
     
 
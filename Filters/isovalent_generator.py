@@ -1,28 +1,62 @@
+import numpy as np
 import pandas as pd
 from Filters import utils
+import functools
 import os
 
-def read_csv():
+# Columns of the element database used by the isovalent generator
+ELEM_DB_COLUMNS = ('Ion', 'Charge', 'Coordination', 'Ionic Radius')
+
+@functools.lru_cache(maxsize=None)
+def read_elem_db(columns=ELEM_DB_COLUMNS):
     """
-    Reads a CSV file containing material data and returns it as a pandas DataFrame.
+    Reads the Parquet file containing material data and returns it as a pandas DataFrame.
     The function ensures that the script works regardless of the current working directory
-    by constructing the path to the CSV file relative to the script's location. It expects
-    the CSV file to be located in a "Materials" subdirectory and named "extracted_table.csv".
+    by constructing the path to the Parquet file relative to the script's location. It expects
+    the file to be located in the "Materials" directory and named "extracted_table.parquet"
+    (a typed copy of "extracted_table.csv"). Only the requested columns are read, and the
+    result is cached so repeated calls do not touch the disk again. The 'Ion', 'Coordination'
+    and 'Charge' columns are stored as categoricals.
+    Args:
+        columns (tuple): The columns to load. Defaults to ELEM_DB_COLUMNS.
     Raises:
-        FileNotFoundError: If the CSV file does not exist at the specified path.
+        FileNotFoundError: If the Parquet file does not exist at the specified path.
     Returns:
-        pandas.DataFrame: A DataFrame containing the data from the CSV file.
+        pandas.DataFrame: A DataFrame containing the data from the Parquet file. The cached
+        DataFrame is shared between calls and must not be modified in place.
     """
 
     # Ensure the script works regardless of the current working directory
     script_dir = os.path.dirname(__file__)
-    # Construct the path to the CSV file relative to the script's location
-    csv_path = os.path.join(script_dir, "..", "materials", "extracted_table.csv")
-    #csv_path = os.path.join(script_dir, "Materials", "extracted_table.csv")
+    # Construct the path to the Parquet file relative to the script's location
+    parquet_path = os.path.join(script_dir, "..", "Materials", "extracted_table.parquet")
+    if not os.path.exists(parquet_path):
+        raise FileNotFoundError(f"Parquet file not found at path: {parquet_path}")
+    elem_db = pd.read_parquet(parquet_path, columns=list(columns))
+    # These low-cardinality columns are filtered on repeatedly, categoricals compare integer codes instead of objects
+    for column in ('Ion', 'Coordination', 'Charge'):
+        if column in elem_db:
+            elem_db[column] = elem_db[column].astype('category')
+    return elem_db
+
+def convert_elem_db():
+    """
+    Writes "extracted_table.parquet" from "extracted_table.csv", the source table in the "Materials" directory.
+    Run it whenever the CSV changes, so that `read_elem_db` reads the same data.
+    Raises:
+        FileNotFoundError: If the CSV file does not exist at the specified path.
+    Returns:
+        str: The path of the written Parquet file.
+    """
+
+    script_dir = os.path.dirname(__file__)
+    csv_path = os.path.join(script_dir, "..", "Materials", "extracted_table.csv")
+    parquet_path = os.path.join(script_dir, "..", "Materials", "extracted_table.parquet")
     if not os.path.exists(csv_path):
         raise FileNotFoundError(f"CSV file not found at path: {csv_path}")
-    elem_db = pd.read_csv(csv_path)
-    return elem_db
+    pd.read_csv(csv_path).to_parquet(parquet_path, index=False, compression="zstd")
+    read_elem_db.cache_clear()  # Drop tables cached from the previous file
+    return parquet_path
 
 def unpack_target(elem_prop:dict)-> tuple:
     """
@@ -101,15 +135,19 @@ def find_substitutes(element, conditions, elem_db, charge, coordination, target_
         target_ub (float): The upper bound of the target property range (used if 'Hume-Rothery' is in conditions).
     Returns:
         pandas.DataFrame: A filtered DataFrame containing potential substitute elements that meet the specified conditions.
+        Columns that `read_elem_db` stores as categoricals ('Ion', 'Coordination' and 'Charge') are returned as categoricals.
     """
     
-    substitutes = elem_db[elem_db['Charge'] == charge]
+    # Combine all conditions into one boolean mask so elem_db is only sliced once
+    mask = elem_db['Charge'].values == charge
     if 'coordination' in conditions:
-        substitutes = substitutes[substitutes['Coordination'] == coordination]
+        mask &= elem_db['Coordination'].values == coordination
     if 'Hume-Rothery' in conditions:
-        substitutes = substitutes[(substitutes[target_property] >= target_lb) & (substitutes[target_property] <= target_ub)]
-    if element in substitutes['Ion'].values:
-        substitutes = substitutes[substitutes['Ion'] != element]
+        # Compare on plain floats, the categorical columns of read_elem_db are unordered and reject >= and <=
+        target_values = np.asarray(elem_db[target_property], dtype=float)
+        mask &= (target_values >= target_lb) & (target_values <= target_ub)
+    mask &= elem_db['Ion'].values != element
+    substitutes = elem_db[mask]
     return substitutes
 
 def hume_rothery_rule(percentage, target_value):
@@ -166,7 +204,7 @@ def main(icsd_true, comp, elem_prop, conditions, condition_value):
         8. Saves the results to a CSV file.
     Notes:
         - The function relies on several utility functions (e.g., `utils.icsd_finder`, `utils.p_syn`, `utils.save`) 
-          and assumes the presence of a CSV file containing element properties.
+          and assumes the presence of a Parquet file containing element properties.
         - The generated CSV file contains detailed information about the novel materials and their matches.
     """
 
@@ -180,7 +218,10 @@ def main(icsd_true, comp, elem_prop, conditions, condition_value):
     print("target_percentage:", target_percentage)
     print("----------------------------------------------------------------")
   
-    elem_db = read_csv()
+    columns = ELEM_DB_COLUMNS
+    if target_property is not None and target_property not in columns:
+        columns += (target_property,)
+    elem_db = read_elem_db(columns)
     target_element = elem_db[(elem_db['Ion'] == element) & (elem_db['Charge'] == element_charge) 
                              &  (elem_db['Coordination'] == element_coordination)]
     print("----------------------------------------------------------------")
@@ -199,14 +240,15 @@ def main(icsd_true, comp, elem_prop, conditions, condition_value):
 
     elem_sub = find_substitutes(element, conditions, elem_db, charge, coordination, target_property, target_lb, target_ub)
     elem_sub = elem_sub.drop_duplicates(subset=['Ion'])
-    novel_mat = []
-    novel_mat.extend([f"Cs{substitute}I3" for substitute in elem_sub['Ion']])
-    # Combine elem_sub and novel_mat into a new DataFrame
-    elem_sub.loc[:, 'Novel Material'] = novel_mat
+    # Build the novel material formulas with vectorized string concatenation
+    elem_sub.loc[:, 'Novel Material'] = "Cs" + elem_sub['Ion'].astype(str) + "I3"
 
     #find the matches with ICSD
     nov_mat_db, true_positive = utils.icsd_finder(icsd_true, elem_sub)
     nov_mat_db = nov_mat_db[['Ion', 'Coordination', 'Charge', 'Ionic Radius', 'Novel Material', 'icsd_ids']].reset_index(drop=True)
+    # The categoricals are only for filtering elem_db, return the columns with their plain dtypes
+    for column in ('Ion', 'Coordination', 'Charge'):
+        nov_mat_db[column] = nov_mat_db[column].astype(nov_mat_db[column].cat.categories.dtype)
     nov_mat_db = nov_mat_db.rename(columns={'Ion': 'Substituted Element'})
     
     #calculate the true positive and false positive and the synthetic p_value
@@ -219,8 +261,8 @@ def main(icsd_true, comp, elem_prop, conditions, condition_value):
     }
     nov_mat_db = utils.add_details_to_csv(nov_mat_db, details)
     
-    # Save the DataFrame to a CSV file
-    utils.save('isovalenet_generator', nov_mat_db, df_name="novel_materials")
+    # Save the DataFrame to a CSV file, the details columns mix numbers and strings which Parquet cannot store
+    utils.save('isovalenet_generator', nov_mat_db, df_name="novel_materials", fmt="csv")
 
     return nov_mat_db, true_positive, p_syn
 
@@ -230,11 +272,13 @@ if __name__ == "__main__":
     h5_filename = 'all_materials_9June2022.h5'  # Replace with the actual HDF5 file name
     h5_file_path = os.path.join('Materials', h5_filename)
 
-    # Read the HDF5 file
-    mat_db = pd.read_hdf(h5_file_path)
+    # Read the whole HDF5 file, then select the two columns icsd_finder needs. The list-valued 'icsd_ids'
+    # column rules out the table format, and fixed-format stores cannot be projected with columns=
+    icsd_columns = ['pretty_formula', 'icsd_ids']
+    mat_db = pd.read_hdf(h5_file_path)[icsd_columns]
 
     # Find the materials with ICSD ID
-    icsd_true = mat_db[mat_db['icsd_ids'].apply(lambda x: len(x) != 0)]
+    icsd_true = mat_db[mat_db['icsd_ids'].str.len().gt(0)]
     elem_prob = {'element': 'Pb', 'coordination': 'VIII', 'charge': 2}
     conditions = ['charge', 'coordination','Hume-Rothery']
     condition_value = {'charge': 2, 'coordination': 'VIII', 'target_property': 'Ionic Radius', 'target_percentage': 15}
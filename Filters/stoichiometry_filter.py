@@ -1,6 +1,35 @@
 import pandas as pd
 from Filters import utils
 
+def parse_atoms(atoms: pd.Series) -> pd.Series:
+    """
+    Parses an "Atoms" column of "[a, b, c]" strings into tuples of atom counts.
+
+    Args:
+    atoms (pandas.Series): The atom counts of each material in their "[a, b, c]" string form.
+
+    Returns:
+    pandas.Series: A Series holding a tuple of float counts per row, with the index of `atoms`.
+    """
+    return atoms.str.findall(r"-?\d+(?:\.\d+)?").map(lambda counts: tuple(map(float, counts)), na_action="ignore")
+
+def stoichiometry_matches(atoms: pd.Series, stoichiometry: list) -> pd.Series:
+    """
+    Checks which rows of an "Atoms" column match one of the given stoichiometries.
+
+    Args:
+    atoms (pandas.Series): The atom counts of each material, either as lists or as their "[a, b, c]" string form.
+    stoichiometry (list): The stoichiometries to be matched, as [a, b, c] lists.
+
+    Returns:
+    pandas.Series: A boolean Series that is True where the atoms of a row match one of the stoichiometries.
+    """
+    if pd.api.types.infer_dtype(atoms, skipna=True) == "string":
+        atoms = parse_atoms(atoms)
+    else:
+        atoms = atoms.map(tuple, na_action="ignore")
+    return atoms.isin({tuple(atom) for atom in stoichiometry})  # Tuples are hashable, so isin can use its hashtable path
+
 def match_stoichimetric_combinations(icsd_true: pd.DataFrame, df: pd.DataFrame) -> pd.Series:
     """
     Checks which stoichiometries have been seen before in other material systems.
@@ -14,8 +43,7 @@ def match_stoichimetric_combinations(icsd_true: pd.DataFrame, df: pd.DataFrame)
     """
     # Existing Stoichioemtry
     stoichiometry = [[3, 1, 6],[3, 2, 9],[1, 1, 4],[2, 1, 6],[1, 1, 3],[1, 2, 5],[4, 1, 6],[1, 2, 7],[2, 1, 5],[3, 1, 5]]
-    atoms = [eval(atom) for atom in df["Atoms"].to_list()]  # Convert string representations of lists to actual lists
-    matches = [atom in stoichiometry for atom in atoms]  # Check membership using a list comprehension
+    matches = stoichiometry_matches(df["Atoms"], stoichiometry)  # Rows whose atom counts match one of the stoichiometries
     nov_mat = df[['composition', 'Atoms']][matches].copy()  # Create a new DataFrame with the selected columns where matches is True
     nov_mat = nov_mat.rename(columns={'composition': 'Novel Material', 'Atoms': 'Atoms'})
 
@@ -27,5 +55,5 @@ def match_stoichimetric_combinations(icsd_true: pd.DataFrame, df: pd.DataFrame)
     #calculate the true positive and false positive and the synthetic p_value
     p_syn = utils.p_syn(nov_mat_db, true_positive)
     
-    utils.save("stoichimetry_match", nov_mat_db, df_name='Ternary_perovskite')  # Save the DataFrame to a CSV file
+    utils.save("stoichimetry_match", nov_mat_db, df_name='Ternary_perovskite')  # Save the DataFrame to a Parquet file
     return nov_mat_db, true_positive, p_syn  # Return the updated DataFrame and the count of true positives
\ No newline at end of file
@@ -1,31 +1,38 @@
-import numpy
 import pandas as pd
 import datetime
 import os
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 
-def save(filter_name, df, df_name=None):
+def save(filter_name, df, df_name=None, fmt="parquet"):
     """
-    Saves the input DataFrame to a CSV file.
+    Saves the input DataFrame to a Parquet or CSV file in the "Results" directory.
 
     Args:
     filter_name (str): The name of the filter.
     df (pandas.DataFrame): The DataFrame to be saved.
+    df_name (str): The prefix of the filename. Defaults to "df".
+    fmt (str): The file format, "parquet" (zstd compressed) or "csv". Defaults to "parquet".
+        Use "csv" for DataFrames with columns mixing value types, which Parquet cannot store.
+
+    Raises:
+    ValueError: If `fmt` is not a supported format.
 
     Returns:
     None
     """
+    if fmt not in ("parquet", "csv"):
+        raise ValueError(f"Unsupported file format: {fmt}")
     timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
     if df_name is None:
         df_name = "df"
-        filename = f"{df_name}_{timestamp}_{filter_name}.csv"
-    else:
-        filename = f"{df_name}_{timestamp}_{filter_name}.csv"
+    filename = f"{df_name}_{timestamp}_{filter_name}.{fmt}"
     results_dir = "Results"
-    if not os.path.exists(results_dir):
-        os.makedirs(results_dir)
+    os.makedirs(results_dir, exist_ok=True)
     filename = os.path.join(results_dir, filename)
-    df.to_csv(filename, index=False)
+    if fmt == "parquet":
+        df.to_parquet(filename, engine="pyarrow", compression="zstd", index=False)
+    else:
+        df.to_csv(filename, index=False)
     
 def icsd_finder(icsd_true, nov_mat):
     """
@@ -42,24 +49,29 @@ def icsd_finder(icsd_true, nov_mat):
     Returns:
         tuple:
             - pandas.DataFrame: The updated `nov_mat` DataFrame with an additional column:
-                - 'icsd_ids': A list of matched ICSD IDs for each novel material.
+                - 'icsd_ids': The matched ICSD IDs for each novel material.
             - int: The count of true positive matches (number of novel materials found in `icsd_true`).
     Notes:
-        - If a novel material matches multiple ICSD IDs, they are concatenated into a single string, 
-          separated by commas.
+        - If a novel material matches multiple ICSD entries, their IDs are concatenated into a single string, 
+          separated by commas (e.g. "23124,410726,1448,411633").
         - If no match is found for a novel material, its 'icsd_ids' entry will remain empty.
+        - `true_positive` counts the rows of `nov_mat` that found a match, not the matching rows of `icsd_true`.
     """
 
-    icsd_ids = numpy.empty(len(nov_mat['Novel Material']), dtype=object)  # Initialize with dtype=object for strings
-    matches = icsd_true[icsd_true['pretty_formula'].isin(nov_mat['Novel Material']) == True]
-    matches = matches[['pretty_formula', 'icsd_ids']]
-    true_positive = len(matches['pretty_formula'])
-    for idx, materials in enumerate(matches['pretty_formula']):
-        icsd = [matches['icsd_ids'].iloc[idx]] #make sure this is a list (that's why the square brackets)
-        for idy, mat_new in enumerate(nov_mat['Novel Material']):
-            if materials == mat_new:
-                icsd_ids[idy] = [','.join(map(str, icsd))]
-    nov_mat['icsd_ids'] = icsd_ids
+    matches = icsd_true.loc[icsd_true['pretty_formula'].isin(nov_mat['Novel Material']), ['pretty_formula', 'icsd_ids']]
+    # Flatten to one ID per row: list-typed IDs (HDF5) explode directly, while IDs read from CSV
+    # are the "[a, b]" string form of a list and are split after stripping the brackets
+    icsd_ids = matches.explode('icsd_ids', ignore_index=True).dropna()
+    icsd_ids['icsd_ids'] = icsd_ids['icsd_ids'].astype(str).str.strip('[]').str.split(',')
+    icsd_ids = icsd_ids.explode('icsd_ids', ignore_index=True)
+    icsd_ids['icsd_ids'] = icsd_ids['icsd_ids'].str.strip()
+    icsd_ids = icsd_ids[icsd_ids['icsd_ids'] != '']
+    # Build the formula -> ICSD IDs lookup once and join on it instead of scanning nov_mat for every match
+    mapping = icsd_ids.groupby('pretty_formula')['icsd_ids'].agg(','.join)
+    # Formulas whose entries carry no IDs still count as known to the ICSD
+    mapping = mapping.reindex(matches['pretty_formula'].unique(), fill_value='')
+    nov_mat['icsd_ids'] = nov_mat['Novel Material'].map(mapping)
+    true_positive = int(nov_mat['icsd_ids'].notna().sum())
     return nov_mat, true_positive
 
 def p_syn(nov_mat, true_positive):
@@ -98,25 +110,25 @@ def add_details_to_csv(nov_mat, details):
         - The first element of each new column or key in `nov_mat` is set to the corresponding value from `details`.
     """
 
+    columns = {}
     for items in details:
         print(items, details[items])
         if isinstance(details[items], (int, float)):  # Corrected isinstance usage
-            nov_mat.loc[0, items] = details[items]
+            columns[items] = [details[items]]
 
         elif isinstance(details[items], dict):  # Corrected isinstance usage
-            idx = 0
-            for keys in details[items].keys():
-                nov_mat.loc[idx, items + "args"] = keys
-                idx += 1
-            idy = 0
-            for values in details[items].values():
-                nov_mat.loc[idy, items] = values
-                idy += 1
+            columns[items + "args"] = list(details[items].keys())
+            columns[items] = list(details[items].values())
             
         else:  # Corrected isinstance usage
-            rows = len(details[items])
-            for row in range(rows):  # Fixed variable name conflict
-                nov_mat.loc[row, items] = details[items][row]
+            columns[items] = list(details[items])
+    # Build every detail column in one go and assign whole columns, instead of setting cells one at a time with .loc
+    details_df = pd.DataFrame({column: pd.Series(values) for column, values in columns.items()})
+    if not details_df.index.isin(nov_mat.index).all():
+        # Append the missing rows after the existing ones, keeping the caller's row order
+        nov_mat = nov_mat.reindex(nov_mat.index.union(details_df.index, sort=False))
+    for column in details_df:
+        nov_mat[column] = details_df[column]  # overwrites a column of the same name
     return nov_mat
 
 def pie_chart(true_positive, false_positive, p_syn):
@@ -131,7 +143,8 @@ def pie_chart(true_positive, false_positive, p_syn):
         - Uses custom colors and an exploded view for better visualization.
         - Displays the percentage of each slice on the chart.
         - Saves the chart as a PNG file in the "./Results/" directory with a filename based on the `p_syn` value.
-        - Displays the chart in a pop-up window.
+        - Draws on a standalone Figure rather than through pyplot, so no GUI window is opened and
+          no figure is left behind in pyplot's registry.
     Note:
         - Ensure the "./Results/" directory exists before calling this function to avoid file-saving errors.
         - The `p_syn` value is formatted to two decimal places in the chart title and filename.
@@ -143,12 +156,12 @@ def pie_chart(true_positive, false_positive, p_syn):
     sizes = [true_positive, false_positive]
     colors = ['#66c2a5', '#fc8d62']
     explode = (0.1, 0.1)  # explode the 1st slice
-    plt.figure(figsize=(8, 6))
-    plt.pie(sizes, explode=explode, labels=labels, colors=colors, autopct='%1.1f%%',
-            shadow=True, startangle=140)
-    plt.title(f'P-Syn: {p_syn:.2f}%', fontsize=14)
-    plt.savefig(f"./Results/pie_chart{p_syn}.png")
-    plt.show()
+    fig = Figure(figsize=(8, 6))
+    ax = fig.subplots()
+    ax.pie(sizes, explode=explode, labels=labels, colors=colors, autopct='%1.1f%%',
+           shadow=True, startangle=140)
+    ax.set_title(f'P-Syn: {p_syn:.2f}%', fontsize=14)
+    fig.savefig(f"./Results/pie_chart{p_syn}.png")
 
 
 